@@ -8,30 +8,34 @@ Constitutional compliance:
 - Transparency: Full audit trail of information sources
 """
 
-from typing import List, Dict, Optional, Tuple, Any
+from typing import List, Dict, Optional, Tuple, Any, Iterator, FrozenSet, Mapping
+from types import MappingProxyType
 from dataclasses import dataclass, field
 from enum import IntEnum
 import logging
-from datetime import datetime
+import asyncio
+import itertools
 import hashlib
-import json
+import orjson
+
+from utils_clock import now_iso
 
 # Import from agricultural-core where these are now located
 # In production, this would be:
 # from ava_olo_agricultural_core.core.localization_handler import InformationRelevance, InformationItem, LocalizationContext
 # For now, we'll define minimal versions here to avoid circular dependencies
 
-from enum import Enum
 from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
 
-class InformationRelevance(Enum):
-    """Information relevance hierarchy as per Constitutional Amendment #13"""
-    FARMER_SPECIFIC = "FARMER"
-    COUNTRY_SPECIFIC = "COUNTRY"
-    GLOBAL = "GLOBAL"
+class InformationRelevance(IntEnum):
+    """Information relevance hierarchy as per Constitutional Amendment #13
+    Values match RelevancePriority; use .name for human-readable output"""
+    FARMER_SPECIFIC = 1
+    COUNTRY_SPECIFIC = 2
+    GLOBAL = 3
 
-@dataclass
+@dataclass(slots=True)
 class InformationItem:
     """Represents a piece of information with its relevance level"""
     content: str
@@ -42,7 +46,7 @@ class InformationItem:
     source_type: str = "unknown"
     metadata: Optional[Dict] = None
 
-@dataclass
+@dataclass(slots=True)
 class LocalizationContext:
     """Context for localization decisions"""
     whatsapp_number: str
@@ -53,6 +57,12 @@ class LocalizationContext:
     preferred_language: Optional[str] = None
     timezone: Optional[str] = None
     agricultural_zones: Optional[List[str]] = None
+    
+    @property
+    def cache_key(self) -> str:
+        """Stable hash of the context for caching"""
+        context_str = f"{self.whatsapp_number}:{self.country_code}:{self.preferred_language}"
+        return hashlib.blake2b(context_str.encode(), digest_size=8).hexdigest()
 
 logger = logging.getLogger(__name__)
 
@@ -64,35 +74,46 @@ class RelevancePriority(IntEnum):
     GLOBAL = 3            # Lowest priority
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class InformationSource:
-    """Represents a source of information with metadata"""
+    """
+    Represents a source of information with metadata
+    Immutable: capability flags are privacy gates, so a source can only
+    change by registering a new one (which rebuilds the role tuples)
+    """
     source_id: str
     source_type: str  # 'database', 'rag', 'external', 'cache'
     source_name: str
     can_access_farmer_data: bool = False
     can_access_country_data: bool = True
     can_access_global_data: bool = True
-    metadata: Dict[str, Any] = field(default_factory=dict)
+    metadata: Mapping[str, Any] = field(default_factory=dict)
+    
+    def __post_init__(self):
+        # Read-only copy so the caller's dict can't alter a registered source
+        object.__setattr__(self, "metadata", MappingProxyType(dict(self.metadata)))
 
 
-@dataclass
+@dataclass(slots=True)
 class InformationQuery:
     """Query for information with context"""
     query_text: str
     context: LocalizationContext
-    required_relevance_levels: List[InformationRelevance] = field(
-        default_factory=lambda: [
-            InformationRelevance.FARMER_SPECIFIC,
-            InformationRelevance.COUNTRY_SPECIFIC,
-            InformationRelevance.GLOBAL
-        ]
-    )
+    required_relevance_levels: FrozenSet[InformationRelevance] = frozenset({
+        InformationRelevance.FARMER_SPECIFIC,
+        InformationRelevance.COUNTRY_SPECIFIC,
+        InformationRelevance.GLOBAL
+    })
     max_items_per_level: int = 5
     include_metadata: bool = True
 
 
-@dataclass
+def _summarize_items(items: List[InformationItem]) -> List[Dict[str, str]]:
+    """Serialize items to the compact content/source shape used by to_dict"""
+    return [{"content": item.content, "source": item.source_type} for item in items]
+
+
+@dataclass(slots=True)
 class InformationResult:
     """Result of information query with hierarchy"""
     query: InformationQuery
@@ -101,8 +122,12 @@ class InformationResult:
     global_items: List[InformationItem] = field(default_factory=list)
     metadata: Dict[str, Any] = field(default_factory=dict)
     
-    def get_all_items_by_priority(self) -> List[InformationItem]:
-        """Get all items sorted by relevance priority"""
+    def get_all_items_by_priority(self) -> Iterator[InformationItem]:
+        """Iterate all items in relevance priority order without copying"""
+        return itertools.chain(self.farmer_items, self.country_items, self.global_items)
+    
+    def get_all_items_as_list(self) -> List[InformationItem]:
+        """Get all items sorted by relevance priority as a new list"""
         return self.farmer_items + self.country_items + self.global_items
     
     def to_dict(self) -> Dict[str, Any]:
@@ -112,15 +137,16 @@ class InformationResult:
             "farmer_id": self.query.context.farmer_id,
             "country_code": self.query.context.country_code,
             "items": {
-                "farmer_specific": [{"content": item.content, "source": item.source_type} 
-                                  for item in self.farmer_items],
-                "country_specific": [{"content": item.content, "source": item.source_type} 
-                                   for item in self.country_items],
-                "global": [{"content": item.content, "source": item.source_type} 
-                          for item in self.global_items]
+                "farmer_specific": _summarize_items(self.farmer_items),
+                "country_specific": _summarize_items(self.country_items),
+                "global": _summarize_items(self.global_items)
             },
             "metadata": self.metadata
         }
+    
+    def to_json(self) -> bytes:
+        """Serialize to UTF-8 encoded JSON"""
+        return orjson.dumps(self.to_dict(), option=orjson.OPT_NON_STR_KEYS)
 
 
 class InformationHierarchyManager:
@@ -129,81 +155,91 @@ class InformationHierarchyManager:
     Ensures constitutional compliance for data privacy and relevance
     """
     
-    def __init__(self):
-        self.sources: Dict[str, InformationSource] = {}
-        self._register_default_sources()
-    
-    def _register_default_sources(self):
-        """Register default information sources"""
+    # Default information sources; immutable, so all managers share them
+    _DEFAULT_SOURCES: Tuple[InformationSource, ...] = (
         # Database source - can access all levels
-        self.register_source(InformationSource(
+        InformationSource(
             source_id="farmer_db",
             source_type="database",
             source_name="Farmer Database",
             can_access_farmer_data=True,
             can_access_country_data=True,
             can_access_global_data=False
-        ))
+        ),
         
         # RAG source - country and global only
-        self.register_source(InformationSource(
+        InformationSource(
             source_id="rag_knowledge",
             source_type="rag",
             source_name="Agricultural Knowledge Base",
             can_access_farmer_data=False,
             can_access_country_data=True,
             can_access_global_data=True
-        ))
+        ),
         
         # External source - global only (privacy protection)
-        self.register_source(InformationSource(
+        InformationSource(
             source_id="external_search",
             source_type="external",
             source_name="Web Search (Perplexity)",
             can_access_farmer_data=False,
             can_access_country_data=False,
             can_access_global_data=True
-        ))
+        )
+    )
+    
+    def __init__(self):
+        self.sources: Dict[str, InformationSource] = {
+            source.source_id: source for source in self._DEFAULT_SOURCES
+        }
+        self._rebuild_source_roles()
     
     def register_source(self, source: InformationSource):
         """Register an information source"""
         self.sources[source.source_id] = source
+        self._rebuild_source_roles()
         logger.info(f"Registered information source: {source.source_name}")
     
-    def query_information(self, query: InformationQuery) -> InformationResult:
+    def _rebuild_source_roles(self):
+        """Group sources by capability so queries skip per-source checks"""
+        sources = self.sources.values()
+        self._farmer_sources = tuple(s for s in sources if s.can_access_farmer_data)
+        self._country_sources = tuple(s for s in sources if s.can_access_country_data)
+        self._global_sources = tuple(s for s in sources if s.can_access_global_data)
+    
+    async def query_information(self, query: InformationQuery) -> InformationResult:
         """
         Query information from all sources respecting hierarchy
         Constitutional compliance: Enforces privacy rules
         """
         result = InformationResult(query=query)
         
-        # Track which sources were used
-        sources_used = []
-        
-        # Query each relevance level
+        # Schedule each required relevance level
+        tasks = {}
         if InformationRelevance.FARMER_SPECIFIC in query.required_relevance_levels:
-            farmer_items = self._query_farmer_specific(query)
-            result.farmer_items = farmer_items[:query.max_items_per_level]
-            if farmer_items:
-                sources_used.append("farmer_specific")
+            tasks["farmer_specific"] = self._query_farmer_specific(query)
         
         if InformationRelevance.COUNTRY_SPECIFIC in query.required_relevance_levels:
-            country_items = self._query_country_specific(query)
-            result.country_items = country_items[:query.max_items_per_level]
-            if country_items:
-                sources_used.append("country_specific")
+            tasks["country_specific"] = self._query_country_specific(query)
         
         if InformationRelevance.GLOBAL in query.required_relevance_levels:
-            global_items = self._query_global(query)
-            result.global_items = global_items[:query.max_items_per_level]
-            if global_items:
-                sources_used.append("global")
+            tasks["global"] = self._query_global(query)
+        
+        # Query levels concurrently - latency is the slowest level, not the sum
+        level_items = dict(zip(tasks, await asyncio.gather(*tasks.values())))
+        
+        result.farmer_items = level_items.get("farmer_specific", [])[:query.max_items_per_level]
+        result.country_items = level_items.get("country_specific", [])[:query.max_items_per_level]
+        result.global_items = level_items.get("global", [])[:query.max_items_per_level]
+        
+        # Track which sources were used
+        sources_used = [level for level, items in level_items.items() if items]
         
         # Add metadata
         result.metadata = {
-            "query_timestamp": datetime.utcnow().isoformat(),
+            "query_timestamp": now_iso(),
             "sources_used": sources_used,
-            "total_items": len(result.get_all_items_by_priority()),
+            "total_items": len(result.farmer_items) + len(result.country_items) + len(result.global_items),
             "context_hash": self._hash_context(query.context)
         }
         
@@ -212,65 +248,71 @@ class InformationHierarchyManager:
         
         return result
     
-    def _query_farmer_specific(self, query: InformationQuery) -> List[InformationItem]:
+    async def _query_farmer_specific(self, query: InformationQuery) -> List[InformationItem]:
         """
         Query farmer-specific information
         Privacy protection: Only from authorized sources
         """
         items = []
         
-        for source_id, source in self.sources.items():
-            if source.can_access_farmer_data and query.context.farmer_id:
-                # In real implementation, this would call the actual source
-                # For now, we'll create placeholder logic
-                logger.debug(f"Querying farmer data from {source.source_name}")
-                
-                # Example: Query farmer's database records
-                if source.source_type == "database":
-                    # This would be replaced with actual database query
-                    items.extend(self._mock_farmer_database_query(query))
+        if not query.context.farmer_id:
+            return items
+        
+        for source in self._farmer_sources:
+            # In real implementation, this would call the actual source
+            # For now, we'll create placeholder logic
+            logger.debug(f"Querying farmer data from {source.source_name}")
+            
+            # Example: Query farmer's database records
+            if source.source_type == "database":
+                # This would be replaced with actual database query
+                items.extend(self._mock_farmer_database_query(query))
         
         return items
     
-    def _query_country_specific(self, query: InformationQuery) -> List[InformationItem]:
+    async def _query_country_specific(self, query: InformationQuery) -> List[InformationItem]:
         """Query country-specific information"""
         items = []
         
-        for source_id, source in self.sources.items():
-            if source.can_access_country_data and query.context.country_code:
-                logger.debug(f"Querying country data from {source.source_name}")
-                
-                # Example: Query country-specific knowledge
-                if source.source_type == "rag":
-                    # This would be replaced with actual RAG query
-                    items.extend(self._mock_country_rag_query(query))
+        if not query.context.country_code:
+            return items
+        
+        for source in self._country_sources:
+            logger.debug(f"Querying country data from {source.source_name}")
+            
+            # Example: Query country-specific knowledge
+            if source.source_type == "rag":
+                # This would be replaced with actual RAG query
+                items.extend(self._mock_country_rag_query(query))
         
         return items
     
-    def _query_global(self, query: InformationQuery) -> List[InformationItem]:
+    async def _query_global(self, query: InformationQuery) -> List[InformationItem]:
         """Query global information"""
         items = []
         
-        for source_id, source in self.sources.items():
-            if source.can_access_global_data:
-                logger.debug(f"Querying global data from {source.source_name}")
-                
-                # Example: Query global knowledge
-                if source.source_type in ["rag", "external"]:
-                    # This would be replaced with actual query
-                    items.extend(self._mock_global_query(query))
+        for source in self._global_sources:
+            logger.debug(f"Querying global data from {source.source_name}")
+            
+            # Example: Query global knowledge
+            if source.source_type in ["rag", "external"]:
+                # This would be replaced with actual query
+                items.extend(self._mock_global_query(query))
         
         return items
     
     def _hash_context(self, context: LocalizationContext) -> str:
         """Create hash of context for caching"""
-        context_str = f"{context.whatsapp_number}:{context.country_code}:{context.preferred_language}"
-        return hashlib.sha256(context_str.encode()).hexdigest()[:16]
+        return context.cache_key
     
     def _log_query(self, result: InformationResult):
         """Log query for transparency and debugging"""
+        # Skip building and serializing the entry when INFO records are discarded
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        
         log_entry = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": now_iso(),
             "query": result.query.query_text,
             "farmer_id": result.query.context.farmer_id,
             "country": result.query.context.country_code,
@@ -280,7 +322,8 @@ class InformationHierarchyManager:
                 "global": len(result.global_items)
             }
         }
-        logger.info(f"Information query completed: {json.dumps(log_entry)}")
+        # Compact JSON (no spaces after separators, non-ASCII emitted as UTF-8)
+        logger.info("Information query completed: %s", orjson.dumps(log_entry).decode())
     
     # Mock methods for demonstration - replace with actual implementations
     def _mock_farmer_database_query(self, query: InformationQuery) -> List[InformationItem]:
@@ -353,8 +396,15 @@ class InformationHierarchyManager:
         }
 
 
+# Default sources are registered by every manager; record them once for the audit trail
+for _source in InformationHierarchyManager._DEFAULT_SOURCES:
+    logger.info(f"Registered default information source: {_source.source_name}")
+del _source
+
+
 # Example usage
 if __name__ == "__main__":
+    import json
     from localization_handler import LocalizationContext
     
     # Initialize manager
@@ -377,7 +427,7 @@ if __name__ == "__main__":
     )
     
     # Execute query
-    result = manager.query_information(query)
+    result = asyncio.run(manager.query_information(query))
     
     # Display results
     print("Information Hierarchy Results:")
@@ -3,32 +3,163 @@ Knowledge Search - Agricultural knowledge retrieval (RAG)
 Handles FIS documents and agricultural best practices
 """
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, NamedTuple, Union
 import os
+import asyncio
+import hashlib
+import heapq
+import time
+from collections import OrderedDict
+import numpy as np
 from dotenv import load_dotenv
-from pinecone import Pinecone
-from openai import OpenAI
+from pinecone.grpc import PineconeGRPC as Pinecone
+from openai import AsyncOpenAI
+import httpx
 import json
-from datetime import datetime
+from utils_clock import now_iso
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+
+class ProtectionEntry(NamedTuple):
+    """Crop protection recommendation extracted from a search match"""
+    chemical: str
+    target: str
+    dosage: str
+    timing: str
+    text: str
+
+
+def _normalize_query(query: str) -> str:
+    """Normalize a search query for cache lookups"""
+    return query.strip().lower()
+
+
+def _copy_documents(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copy search result documents so callers can't mutate cached entries"""
+    return [{**doc, "metadata": dict(doc["metadata"])} for doc in documents]
+
+
+def _quantize(vector: np.ndarray) -> Tuple[np.float32, np.ndarray]:
+    """Quantize a float32 vector to int8 with a per-vector scale (4x smaller)"""
+    peak = float(np.max(np.abs(vector)))
+    scale = np.float32(127.0 / peak) if peak > 0 else np.float32(1.0)
+    return scale, np.round(vector * scale).astype(np.int8)
+
+
+def _dequantize(scale: np.float32, quantized: np.ndarray) -> np.ndarray:
+    """Restore a float32 vector from its int8 quantized form"""
+    return quantized.astype(np.float32) * (np.float32(1.0) / scale)
+
+
 class KnowledgeSearch:
     """
     Agricultural knowledge search using Pinecone vector database
     Contains FIS documents, best practices, and agricultural knowledge
     """
     
+    EMBEDDING_CACHE_SIZE = 4096
+    RESULT_CACHE_SIZE = 1024
+    RESULT_CACHE_TTL = 300  # seconds
+    EMBEDDING_BATCH_SIZE = 256
+    UPSERT_BATCH_SIZE = 100
+    OPENAI_MAX_CONCURRENCY = 16
+    
+    # Documents are partitioned into Pinecone namespaces by document_type;
+    # vectors indexed before that live in the default namespace
+    LEGACY_NAMESPACE = ""
+    
+    # Filter fields supported by the index; values of lowercase keys are normalized
+    # (document_type is selected via namespace, not metadata filter)
+    _LOWER_FILTER_KEYS = frozenset({"crop", "chemical"})
+    _PASSTHROUGH_FILTER_KEYS = frozenset({"language"})
+    
     def __init__(self):
-        self.pc = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
-        self.openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        # Clients are created on first use so construction does no network I/O
+        self._pinecone_api_key = os.getenv('PINECONE_API_KEY')
+        self._openai_api_key = os.getenv('OPENAI_API_KEY')
+        self._pc = None
+        self._index = None
+        self._openai_client = None
         self.index_name = os.getenv('PINECONE_INDEX_NAME', 'ava-olo-knowledge')
-        self.index = self.pc.Index(self.index_name)
         self.embedding_model = "text-embedding-ada-002"
         
-    async def search(self, query: str, filters: Dict[str, Any] = None, top_k: int = 5) -> List[Dict[str, Any]]:
+        # Limit in-flight OpenAI requests sharing the pooled HTTP/2 connections;
+        # created in the running loop (see _bind_openai_loop)
+        self._openai_semaphore: Optional[asyncio.Semaphore] = None
+        self._openai_loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # Per-instance caches for repeated queries
+        self._embedding_cache: "OrderedDict[tuple, Tuple[np.float32, np.ndarray]]" = OrderedDict()
+        self._result_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._namespaces: Optional[Tuple[str, ...]] = None
+        
+    @property
+    def pc(self) -> Pinecone:
+        """Pinecone client, created on first access"""
+        if self._pc is None:
+            self._pc = Pinecone(api_key=self._pinecone_api_key)
+        return self._pc
+    
+    @property
+    def index(self):
+        """Pinecone index, resolved on first access (performs describe_index)"""
+        if self._index is None:
+            self._index = self.pc.Index(name=self.index_name)
+        return self._index
+    
+    @property
+    def openai_client(self) -> AsyncOpenAI:
+        """OpenAI client over a pooled HTTP/2 connection, created on first access"""
+        self._bind_openai_loop()
+        if self._openai_client is None:
+            self._openai_client = AsyncOpenAI(
+                api_key=self._openai_api_key,
+                http_client=httpx.AsyncClient(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+                )
+            )
+        return self._openai_client
+    
+    def _bind_openai_loop(self):
+        """
+        Tie the semaphore and HTTP client to the running event loop
+        Both are loop-bound, so an instance reused across asyncio.run() calls
+        gets fresh ones instead of failing on the previous (closed) loop
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        
+        if loop is not self._openai_loop:
+            self._openai_loop = loop
+            self._openai_semaphore = asyncio.Semaphore(self.OPENAI_MAX_CONCURRENCY)
+            # The previous pool belongs to a loop that is gone and can't be awaited
+            self._openai_client = None
+    
+    def _openai_limiter(self) -> asyncio.Semaphore:
+        """Concurrency limit for OpenAI requests in the running event loop"""
+        self._bind_openai_loop()
+        return self._openai_semaphore
+    
+    async def aclose(self):
+        """Close the OpenAI HTTP/2 connection pool if it was created"""
+        if self._openai_client is not None:
+            await self._openai_client.close()
+            self._openai_client = None
+    
+    async def __aenter__(self) -> "KnowledgeSearch":
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+    
+    async def search(self, query: str, filters: Dict[str, Any] = None, top_k: int = 5,
+                     namespace: str = None) -> List[Dict[str, Any]]:
         """
         Search agricultural knowledge base
         
@@ -36,28 +167,56 @@ class KnowledgeSearch:
             query: Search query (any language)
             filters: Optional filters (crop_type, document_type, etc.)
             top_k: Number of results to return
+            namespace: Document type namespace to search; derived from
+                filters["document_type"] when omitted
+            
+        Documents are stored in one Pinecone namespace per document_type.
+        When neither namespace nor filters["document_type"] is given, every
+        namespace in the index is queried and the top_k best matches are merged.
+        While a document_type namespace doesn't exist yet, the legacy default
+        namespace is queried with a document_type metadata filter instead.
             
         Returns:
             List of relevant documents with metadata
         """
         try:
-            # Generate embedding for the query
-            embedding = await self._get_embedding(query)
-            
             # Build filter for Pinecone query
-            pinecone_filter = self._build_filter(filters) if filters else None
+            pinecone_filter = self._build_filter(filters or {}) or None
+            
+            # Route to the document type namespace instead of filtering on it;
+            # without one, search across all namespaces
+            if namespace is None:
+                namespace = (filters or {}).get("document_type")
+            known_namespaces = await self._get_namespaces()
+            if namespace is None:
+                namespaces = known_namespaces
+            elif namespace in known_namespaces:
+                namespaces = (namespace,)
+            else:
+                # Not re-indexed into namespaces yet: filter the legacy namespace
+                namespaces = (self.LEGACY_NAMESPACE,)
+                pinecone_filter = {**(pinecone_filter or {}), "document_type": namespace}
+            
+            # Serve repeated searches from the result cache
+            cache_key = self._result_cache_key(query, namespaces, pinecone_filter, top_k)
+            cached = self._get_cached_result(cache_key)
+            if cached is not None:
+                logger.debug(f"Result cache hit for query: {query}")
+                return cached
+            
+            # Generate embedding for the query (cached per normalized query)
+            embedding = await self._get_query_embedding(query)
             
             # Search Pinecone
-            results = self.index.query(
-                vector=embedding,
-                filter=pinecone_filter,
-                top_k=top_k,
-                include_metadata=True
-            )
+            matches = await self._query_namespaces(embedding, namespaces, pinecone_filter, top_k)
+            
+            # Rerank by per-document boost (metadata "boost", default 1.0); stable,
+            # so equal boosted scores keep Pinecone's order
+            matches = sorted(matches, key=lambda match: -match.score * match.metadata.get("boost", 1.0))
             
             # Process results
             documents = []
-            for match in results.matches:
+            for match in matches:
                 doc = {
                     "id": match.id,
                     "score": match.score,
@@ -78,6 +237,8 @@ class KnowledgeSearch:
                     
                 documents.append(doc)
             
+            self._store_cached_result(cache_key, documents)
+            
             logger.info(f"Found {len(documents)} documents for query: {query}")
             return documents
             
@@ -85,6 +246,35 @@ class KnowledgeSearch:
             logger.error(f"Knowledge search error: {str(e)}")
             return []
     
+    async def _get_namespaces(self) -> Tuple[str, ...]:
+        """Namespaces present in the index, cached until the next successful upsert"""
+        if self._namespaces is None:
+            stats = await asyncio.to_thread(self.index.describe_index_stats)
+            self._namespaces = tuple(sorted(stats.namespaces))
+        return self._namespaces
+    
+    async def _query_namespaces(self, embedding: np.ndarray, namespaces: Tuple[str, ...],
+                                pinecone_filter: Optional[Dict[str, Any]], top_k: int) -> list:
+        """Query each namespace concurrently and merge the top_k best matches by score"""
+        # Client takes plain lists at the boundary
+        vector = embedding.tolist()
+        results = await asyncio.gather(*(
+            asyncio.to_thread(
+                self.index.query,
+                vector=vector,
+                namespace=namespace,
+                filter=pinecone_filter,
+                top_k=top_k,
+                include_metadata=True
+            )
+            for namespace in namespaces
+        ))
+        
+        if len(results) == 1:
+            return list(results[0].matches)
+        return heapq.nlargest(top_k, (match for result in results for match in result.matches),
+                              key=lambda match: match.score)
+    
     async def search_pesticide_info(self, chemical_name: str, crop: str = None) -> Dict[str, Any]:
         """
         Specialized search for pesticide information
@@ -98,13 +288,12 @@ class KnowledgeSearch:
             
             # Search with specific filters
             filters = {
-                "document_type": "pesticide",
                 "chemical": chemical_name.lower()
             }
             if crop:
                 filters["crop"] = crop.lower()
             
-            documents = await self.search(query, filters, top_k=3)
+            documents = await self.search(query, filters, top_k=3, namespace="pesticide")
             
             # Extract PHI (karenca) information
             phi_info = None
@@ -139,9 +328,10 @@ class KnowledgeSearch:
                 "error": str(e)
             }
     
-    async def search_crop_protection(self, crop: str, problem: str = None) -> List[Dict[str, Any]]:
+    async def search_crop_protection(self, crop: str, problem: str = None) -> Dict[str, List[ProtectionEntry]]:
         """
         Search for crop protection recommendations
+        Entries are ProtectionEntry tuples; use ._asdict() where a dict is needed
         """
         try:
             # Build query based on crop and problem
@@ -150,11 +340,10 @@ class KnowledgeSearch:
                 query += f" {problem}"
             
             filters = {
-                "document_type": "crop_protection",
                 "crop": crop.lower()
             }
             
-            documents = await self.search(query, filters, top_k=5)
+            documents = await self.search(query, filters, top_k=5, namespace="crop_protection")
             
             # Group by protection type
             protection_info = {
@@ -165,14 +354,14 @@ class KnowledgeSearch:
             }
             
             for doc in documents:
-                protection_type = doc.get("metadata", {}).get("protection_type", "general")
-                protection_info[protection_type].append({
-                    "chemical": doc.get("metadata", {}).get("chemical", ""),
-                    "target": doc.get("metadata", {}).get("target_pest", ""),
-                    "dosage": doc.get("metadata", {}).get("dosage", ""),
-                    "timing": doc.get("metadata", {}).get("application_timing", ""),
-                    "text": doc["text"]
-                })
+                metadata_get = (doc.get("metadata") or {}).get
+                protection_info[metadata_get("protection_type", "general")].append(ProtectionEntry(
+                    metadata_get("chemical", ""),
+                    metadata_get("target_pest", ""),
+                    metadata_get("dosage", ""),
+                    metadata_get("application_timing", ""),
+                    doc["text"]
+                ))
             
             return protection_info
             
@@ -180,35 +369,134 @@ class KnowledgeSearch:
             logger.error(f"Crop protection search error: {str(e)}")
             return {"error": str(e)}
     
-    async def _get_embedding(self, text: str) -> List[float]:
-        """Generate embedding for text"""
-        try:
-            response = self.openai_client.embeddings.create(
-                model=self.embedding_model,
+    async def _create_embedding(self, model: str, text: str) -> np.ndarray:
+        """Call the OpenAI embeddings API, bounded by the shared concurrency limit"""
+        async with self._openai_limiter():
+            response = await self.openai_client.embeddings.create(
+                model=model,
                 input=text
             )
-            return response.data[0].embedding
+        return np.asarray(response.data[0].embedding, dtype=np.float32)
+    
+    async def _get_embedding(self, text: str) -> np.ndarray:
+        """Generate embedding for text"""
+        try:
+            return await self._create_embedding(self.embedding_model, text)
         except Exception as e:
             logger.error(f"Embedding generation error: {str(e)}")
             raise
     
-    def _build_filter(self, filters: Dict[str, Any]) -> Dict[str, Any]:
-        """Build Pinecone filter from user filters"""
-        pinecone_filter = {}
+    async def _create_embeddings(self, model: str, texts: List[str]) -> np.ndarray:
+        """Call the OpenAI embeddings API for a batch of texts"""
+        async with self._openai_limiter():
+            response = await self.openai_client.embeddings.create(
+                model=model,
+                input=texts
+            )
+        return np.asarray(
+            [item.embedding for item in sorted(response.data, key=lambda item: item.index)],
+            dtype=np.float32
+        )
+    
+    async def _get_embeddings_batch(self, texts: List[str], batch: int) -> List[Union[np.ndarray, BaseException]]:
+        """
+        Generate embeddings for many texts, one API call per batch of `batch` texts
+        Returns one entry per batch: a (B, dim) float32 array, or the exception
+        that batch raised, so one failed batch doesn't discard the others
+        """
+        return await asyncio.gather(*(
+            self._create_embeddings(self.embedding_model, texts[i:i + batch])
+            for i in range(0, len(texts), batch)
+        ), return_exceptions=True)
+    
+    async def _get_query_embedding(self, query: str) -> np.ndarray:
+        """Generate embedding for a search query, cached by (model, normalized query)"""
+        key = (self.embedding_model, _normalize_query(query))
+        
+        entry = self._embedding_cache.get(key)
+        if entry is not None:
+            self._embedding_cache.move_to_end(key)
+            return _dequantize(*entry)
+        
+        try:
+            embedding = await self._create_embedding(*key)
+        except Exception as e:
+            logger.error(f"Embedding generation error: {str(e)}")
+            raise
+        
+        self._embedding_cache[key] = _quantize(embedding)
+        while len(self._embedding_cache) > self.EMBEDDING_CACHE_SIZE:
+            self._embedding_cache.popitem(last=False)
         
-        if "document_type" in filters:
-            pinecone_filter["document_type"] = filters["document_type"]
+        # Only the stored entry is quantized; this query uses full precision
+        return embedding
+    
+    def _result_cache_key(self, query: str, namespaces: Tuple[str, ...],
+                          pinecone_filter: Optional[Dict[str, Any]], top_k: int) -> tuple:
+        """Build result cache key from model, normalized query, namespaces, filter and top_k"""
+        return (
+            self.embedding_model,
+            _normalize_query(query),
+            namespaces,
+            json.dumps(pinecone_filter, sort_keys=True),
+            top_k
+        )
+    
+    def _get_cached_result(self, key: tuple) -> Optional[List[Dict[str, Any]]]:
+        """Return a copy of the cached search result if present and not expired"""
+        entry = self._result_cache.get(key)
+        if entry is None:
+            return None
         
-        if "crop" in filters:
-            pinecone_filter["crop"] = filters["crop"].lower()
+        stored_at, documents = entry
+        if time.monotonic() - stored_at > self.RESULT_CACHE_TTL:
+            del self._result_cache[key]
+            return None
         
-        if "chemical" in filters:
-            pinecone_filter["chemical"] = filters["chemical"].lower()
+        self._result_cache.move_to_end(key)
+        return _copy_documents(documents)
+    
+    def _store_cached_result(self, key: tuple, documents: List[Dict[str, Any]]):
+        """Store a copy of a search result, evicting the oldest entries past RESULT_CACHE_SIZE"""
+        self._result_cache[key] = (time.monotonic(), _copy_documents(documents))
+        self._result_cache.move_to_end(key)
+        while len(self._result_cache) > self.RESULT_CACHE_SIZE:
+            self._result_cache.popitem(last=False)
+    
+    def _build_filter(self, filters: Dict[str, Any]) -> Dict[str, Any]:
+        """Build Pinecone filter from user filters"""
+        return {
+            key: (value.lower() if key in self._LOWER_FILTER_KEYS else value)
+            for key, value in filters.items()
+            if key in self._LOWER_FILTER_KEYS or key in self._PASSTHROUGH_FILTER_KEYS
+        }
+    
+    def _build_metadata(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Build Pinecone metadata for a document"""
+        metadata = {
+            "text": document["text"],
+            "source": document.get("source", "manual"),
+            "document_type": document.get("document_type", "general"),
+            "language": document.get("language", "hr"),
+            "indexed_at": now_iso()
+        }
         
-        if "language" in filters:
-            pinecone_filter["language"] = filters["language"]
+        # Add agricultural specific metadata
+        if "crop" in document:
+            metadata["crop"] = document["crop"].lower()
+        if "chemical" in document:
+            metadata["chemical"] = document["chemical"].lower()
+        if "phi_days" in document:
+            metadata["phi_days"] = document["phi_days"]
+        if "boost" in document:
+            metadata["boost"] = float(document["boost"])
         
-        return pinecone_filter
+        return metadata
+    
+    def _document_id(self, document: Dict[str, Any]) -> str:
+        """Generate stable vector ID for a document (same text -> same ID across processes)"""
+        content_hash = hashlib.blake2b(document["text"].encode("utf-8"), digest_size=16).hexdigest()
+        return f"{document.get('source', 'doc')}_{content_hash}"
     
     async def add_document(self, document: Dict[str, Any]) -> bool:
         """
@@ -219,31 +507,20 @@ class KnowledgeSearch:
             # Generate embedding
             embedding = await self._get_embedding(document["text"])
             
-            # Prepare metadata
-            metadata = {
-                "text": document["text"],
-                "source": document.get("source", "manual"),
-                "document_type": document.get("document_type", "general"),
-                "language": document.get("language", "hr"),
-                "indexed_at": datetime.now().isoformat()
-            }
-            
-            # Add agricultural specific metadata
-            if "crop" in document:
-                metadata["crop"] = document["crop"].lower()
-            if "chemical" in document:
-                metadata["chemical"] = document["chemical"].lower()
-            if "phi_days" in document:
-                metadata["phi_days"] = document["phi_days"]
-            
-            # Generate ID
-            doc_id = f"{document.get('source', 'doc')}_{hash(document['text'])}"
+            # Prepare metadata and ID
+            metadata = self._build_metadata(document)
+            doc_id = self._document_id(document)
             
-            # Upsert to Pinecone
+            # Upsert to Pinecone, partitioned by document type
             self.index.upsert(
-                vectors=[(doc_id, embedding, metadata)]
+                vectors=[(doc_id, embedding.tolist(), metadata)],
+                namespace=metadata["document_type"]
             )
             
+            # Cached search results and namespaces may no longer reflect the index
+            self._result_cache.clear()
+            self._namespaces = None
+            
             logger.info(f"Added document {doc_id} to knowledge base")
             return True
             
@@ -254,6 +531,7 @@ class KnowledgeSearch:
     async def bulk_index_fis_documents(self, documents: List[Dict[str, Any]]) -> Dict[str, int]:
         """
         Bulk index FIS documents
+        Embeddings are requested in batches and vectors upserted in chunks
         Returns statistics about indexing
         """
         stats = {
@@ -262,12 +540,61 @@ class KnowledgeSearch:
             "failed": 0
         }
         
-        for doc in documents:
-            success = await self.add_document(doc)
-            if success:
-                stats["success"] += 1
-            else:
-                stats["failed"] += 1
+        # Documents without text cannot be embedded
+        valid_documents = [doc for doc in documents if doc.get("text")]
+        stats["failed"] += len(documents) - len(valid_documents)
+        
+        if not valid_documents:
+            logger.info(f"Bulk indexing complete: {stats}")
+            return stats
+        
+        batch_size = self.EMBEDDING_BATCH_SIZE
+        batch_embeddings = await self._get_embeddings_batch(
+            [doc["text"] for doc in valid_documents], batch_size
+        )
+        
+        # Group vectors by document type namespace, skipping failed batches
+        vectors_by_namespace: Dict[str, List[tuple]] = {}
+        for start, embeddings in zip(range(0, len(valid_documents), batch_size), batch_embeddings):
+            batch_documents = valid_documents[start:start + batch_size]
+            if isinstance(embeddings, BaseException):
+                logger.error(f"Error embedding batch of {len(batch_documents)} documents: {str(embeddings)}")
+                stats["failed"] += len(batch_documents)
+                continue
+            
+            for doc, embedding in zip(batch_documents, embeddings):
+                try:
+                    metadata = self._build_metadata(doc)
+                    vectors_by_namespace.setdefault(metadata["document_type"], []).append(
+                        (self._document_id(doc), embedding.tolist(), metadata)
+                    )
+                except Exception as e:
+                    logger.error(f"Error preparing document for bulk index: {str(e)}")
+                    stats["failed"] += 1
+        
+        # Issue all upsert chunks at once over the gRPC channel, then collect
+        pending = []
+        for namespace, vectors in vectors_by_namespace.items():
+            for i in range(0, len(vectors), self.UPSERT_BATCH_SIZE):
+                chunk = vectors[i:i + self.UPSERT_BATCH_SIZE]
+                try:
+                    pending.append((len(chunk), self.index.upsert(vectors=chunk, namespace=namespace, async_req=True)))
+                except Exception as e:
+                    logger.error(f"Error upserting batch of {len(chunk)} documents: {str(e)}")
+                    stats["failed"] += len(chunk)
+        
+        for chunk_size, future in pending:
+            try:
+                future.result()
+                stats["success"] += chunk_size
+            except Exception as e:
+                logger.error(f"Error upserting batch of {chunk_size} documents: {str(e)}")
+                stats["failed"] += chunk_size
+        
+        # Cached search results and namespaces may no longer reflect the index
+        if stats["success"]:
+            self._result_cache.clear()
+            self._namespaces = None
         
         logger.info(f"Bulk indexing complete: {stats}")
         return stats
\ No newline at end of file
@@ -0,0 +1,23 @@
+"""
+Clock Utilities - Second-resolution UTC timestamps
+Log and metadata timestamps don't need sub-second precision, so the
+ISO string is formatted at most once per second and reused.
+Standalone so knowledge search and the core package share it without
+depending on each other.
+"""
+
+import time
+
+_cached_timestamp = (0, "")
+
+
+def now_iso() -> str:
+    """Current UTC time as an ISO 8601 string truncated to the second"""
+    global _cached_timestamp
+    second = int(time.time())
+    cached_second, cached_iso = _cached_timestamp
+    if second != cached_second:
+        cached_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(second))
+        # Single tuple assignment keeps second and string consistent across threads
+        _cached_timestamp = (second, cached_iso)
+    return cached_iso
\ No newline at end of file
@@ -0,0 +1,24 @@
+"""
+Numba Utilities - Compiled numeric kernels for knowledge search
+For local similarity math on float32 arrays that are already contiguous;
+not imported by knowledge_search, so importing it stays numba-free.
+Set NUMBA_CACHE_DIR to keep compiled kernels out of the source tree.
+"""
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True, fastmath=True)
+def rerank(scores: np.ndarray, boosts: np.ndarray) -> np.ndarray:
+    """
+    Rerank matches by boosted score
+    
+    Args:
+        scores: float32 similarity scores from Pinecone
+        boosts: float32 per-match boost factors (1.0 = neutral)
+        
+    Returns:
+        int64 indices ordering matches from highest to lowest boosted score
+    """
+    weighted = scores * boosts
+    return np.argsort(-weighted, kind="mergesort")
\ No newline at end of file